@@ -1,14 +1,23 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import os
 import logging
+import asyncio
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+import hashlib
+import json
+import re
+import zlib
+from datetime import datetime, timedelta, timezone
 # Removed emergentintegrations - using direct OpenAI API instead
 import httpx
 
@@ -277,6 +286,375 @@ Provide accurate, evidence-based nutritional information and health guidance."""
         raise HTTPException(status_code=500, detail=f"Failed to generate recipe: {str(e)}")
 
 
+async def load_health_profile(profile_id: Optional[str] = None) -> Optional[HealthProfile]:
+    """Load a health profile by ID, or the default profile when no ID is given"""
+    query = {"id": profile_id} if profile_id else {}
+    profile_doc = await db.health_profiles.find_one(query, {"_id": 0})
+    if not profile_doc:
+        return None
+    
+    if isinstance(profile_doc.get('created_date'), str):
+        profile_doc['created_date'] = datetime.fromisoformat(profile_doc['created_date'])
+    if isinstance(profile_doc.get('updated_date'), str):
+        profile_doc['updated_date'] = datetime.fromisoformat(profile_doc['updated_date'])
+    return HealthProfile(**profile_doc)
+
+
+# ============= Cache Invalidation Bus =============
+
+# Each worker process keeps its own caches, so every cacheable region has a
+# version counter in the cache_versions collection. Writers bump the counter
+# and all workers learn the new version through a change stream (replica sets)
+# or by polling (standalone servers), then drop whatever they cached for it.
+CACHE_REGIONS = ["ingredients", "recipes", "pantry", "health_profile"]
+CACHE_INVALIDATION_POLL_SECONDS = float(os.environ.get('CACHE_INVALIDATION_POLL_SECONDS', '2'))
+
+cache_versions = {}  # region -> latest version seen by this worker
+cache_invalidation_handlers = {region: [] for region in CACHE_REGIONS}
+cache_invalidation_task = None
+
+
+def on_cache_invalidation(*regions: str):
+    """Register a function to call whenever one of the regions is invalidated"""
+    def decorator(handler):
+        for region in regions:
+            cache_invalidation_handlers[region].append(handler)
+        return handler
+    return decorator
+
+
+def apply_cache_version(region: str, version: int) -> None:
+    """Record a region version and run its handlers if the version is new"""
+    if region not in cache_invalidation_handlers or version <= cache_versions.get(region, -1):
+        return
+    
+    is_initial_load = region not in cache_versions
+    cache_versions[region] = version
+    if is_initial_load:
+        return
+    for handler in cache_invalidation_handlers[region]:
+        try:
+            handler()
+        except Exception as e:
+            logging.error(f"Cache invalidation handler failed for '{region}': {str(e)}")
+
+
+async def invalidate_cache(region: str) -> None:
+    """Bump a region version so every worker drops its cached data"""
+    doc = await db.cache_versions.find_one_and_update(
+        {"_id": region},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    apply_cache_version(region, doc["version"])
+
+
+async def load_cache_versions() -> None:
+    """Read all region versions from MongoDB"""
+    async for doc in db.cache_versions.find({}):
+        apply_cache_version(doc["_id"], doc["version"])
+
+
+async def poll_cache_versions() -> None:
+    """Fallback for standalone servers without change stream support"""
+    while True:
+        await asyncio.sleep(CACHE_INVALIDATION_POLL_SECONDS)
+        try:
+            await load_cache_versions()
+        except PyMongoError as e:
+            logging.error(f"Error polling cache versions: {str(e)}")
+
+
+async def watch_cache_versions() -> None:
+    """Follow version changes from other workers for the lifetime of the process"""
+    while True:
+        try:
+            async with db.cache_versions.watch(full_document="updateLookup") as stream:
+                # Reload after the stream is open so no change in between is missed
+                await load_cache_versions()
+                async for change in stream:
+                    doc = change.get("fullDocument")
+                    if doc:
+                        apply_cache_version(doc["_id"], doc["version"])
+        except OperationFailure as e:
+            logging.info(f"Change streams unavailable ({e.code}), polling cache versions instead")
+            await poll_cache_versions()
+        except PyMongoError as e:
+            logging.error(f"Cache version change stream interrupted: {str(e)}")
+            await asyncio.sleep(CACHE_INVALIDATION_POLL_SECONDS)
+
+
+@app.on_event("startup")
+async def start_cache_invalidation_bus():
+    """Make sure every region has a version, then start following changes"""
+    global cache_invalidation_task
+    for region in CACHE_REGIONS:
+        try:
+            await db.cache_versions.update_one(
+                {"_id": region}, {"$setOnInsert": {"version": 0}}, upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Another worker created it concurrently
+    await load_cache_versions()
+    cache_invalidation_task = asyncio.create_task(watch_cache_versions())
+
+
+# ============= Speculative Pre-generation =============
+
+# Opt-in: after the pantry or health profile changes and the user goes idle,
+# generate recipes for their most common meal types in the background so the
+# next matching /recipes/generate call skips the LLM round trip.
+SPECULATIVE_GENERATION_ENABLED = os.environ.get('SPECULATIVE_GENERATION', 'false').lower() == 'true'
+SPECULATIVE_IDLE_SECONDS = float(os.environ.get('SPECULATIVE_IDLE_SECONDS', '30'))
+# Shared by all workers through the speculative_calls collection
+SPECULATIVE_MAX_CALLS_PER_HOUR = int(os.environ.get('SPECULATIVE_MAX_CALLS_PER_HOUR', '6'))
+# Per worker: concurrent speculative LLM calls within one process
+SPECULATIVE_MAX_CONCURRENCY = int(os.environ.get('SPECULATIVE_MAX_CONCURRENCY', '1'))
+SPECULATIVE_TOP_PREFERENCES = 2  # meal type / dietary preference combinations to pre-generate
+SPECULATIVE_DEFAULT_PREFERENCES = [("lunch", "plant-based")]  # used when there is no recipe history
+SPECULATIVE_SERVINGS = 2
+SPECULATIVE_STAGING_TTL_SECONDS = 24 * 3600  # backstop for staged recipes nobody claims
+
+# Staged recipes live in the speculative_recipes collection so any worker can
+# serve them; each is tagged with the pantry and health_profile region versions
+# it was generated under and only matches while those versions are current.
+speculative_tasks = set()
+speculative_semaphore = asyncio.Semaphore(SPECULATIVE_MAX_CONCURRENCY)
+speculative_generation = 0  # bumped whenever staged results go stale
+
+
+def speculation_key(pantry_items: List[str], dietary_preference: str, meal_type: str, servings: int, health_profile_id: Optional[str]) -> str:
+    """Key identifying which generate requests a staged recipe can answer"""
+    items = sorted({item.strip().lower() for item in pantry_items})
+    key_data = json.dumps([items, dietary_preference, meal_type, servings, health_profile_id])
+    return hashlib.sha1(key_data.encode()).hexdigest()
+
+
+def current_speculation_versions() -> dict:
+    """Region versions a staged recipe must carry to still be valid"""
+    return {
+        "pantry_version": cache_versions.get("pantry"),
+        "health_profile_version": cache_versions.get("health_profile"),
+    }
+
+
+async def drop_stale_speculative_recipes() -> None:
+    """Delete staged recipes generated under an older pantry or health profile"""
+    versions = current_speculation_versions()
+    await db.speculative_recipes.delete_many(
+        {"$or": [{field: {"$ne": version}} for field, version in versions.items()]}
+    )
+
+
+async def claim_speculative_recipe(key: str) -> Optional[dict]:
+    """Atomically take a staged recipe for this key, so only one request uses it"""
+    return await db.speculative_recipes.find_one_and_delete(
+        {"key": key, **current_speculation_versions()}, {"_id": 0}
+    )
+
+
+@on_cache_invalidation("pantry", "health_profile")
+def discard_speculative_results() -> None:
+    """Cancel pending speculation after a pantry or profile change"""
+    global speculative_generation
+    speculative_generation += 1
+    for task in list(speculative_tasks):
+        task.cancel()
+
+
+def schedule_speculative_generation() -> None:
+    """Discard stale speculation and, if enabled, schedule a new idle-time run"""
+    discard_speculative_results()
+    if not SPECULATIVE_GENERATION_ENABLED:
+        return
+    
+    task = asyncio.create_task(run_speculative_generation(speculative_generation))
+    speculative_tasks.add(task)
+    task.add_done_callback(speculative_tasks.discard)
+
+
+async def get_common_meal_preferences() -> List[tuple]:
+    """Most frequent (meal_type, dietary_preference) pairs among saved recipes"""
+    pipeline = [
+        {"$group": {
+            "_id": {"meal_type": "$meal_type", "dietary_preference": {"$arrayElemAt": ["$dietary_tags", 0]}},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": SPECULATIVE_TOP_PREFERENCES},
+    ]
+    groups = await db.recipes.aggregate(pipeline).to_list(SPECULATIVE_TOP_PREFERENCES)
+    preferences = [
+        (group["_id"]["meal_type"], group["_id"]["dietary_preference"])
+        for group in groups
+        if group["_id"].get("meal_type") and group["_id"].get("dietary_preference")
+    ]
+    return preferences or SPECULATIVE_DEFAULT_PREFERENCES
+
+
+@app.on_event("startup")
+async def ensure_speculative_indexes():
+    """Expire budget entries after an hour and unclaimed staged recipes after a day"""
+    if SPECULATIVE_GENERATION_ENABLED:
+        await db.speculative_calls.create_index("created_date", expireAfterSeconds=3600)
+        await db.speculative_recipes.create_index("key")
+        await db.speculative_recipes.create_index(
+            "created_date", expireAfterSeconds=SPECULATIVE_STAGING_TTL_SECONDS
+        )
+
+
+async def reserve_speculative_call() -> bool:
+    """Consume one LLM call from the hourly speculation budget shared by all workers"""
+    now = datetime.now(timezone.utc)
+    # Reserve first and count afterwards, so racing workers can only undershoot the budget
+    result = await db.speculative_calls.insert_one({"created_date": now})
+    # The TTL monitor only runs every minute, so count the window explicitly
+    used = await db.speculative_calls.count_documents(
+        {"created_date": {"$gt": now - timedelta(hours=1)}}
+    )
+    if used > SPECULATIVE_MAX_CALLS_PER_HOUR:
+        await db.speculative_calls.delete_one({"_id": result.inserted_id})
+        return False
+    return True
+
+
+async def run_speculative_generation(generation: int) -> None:
+    """Wait for the user to go idle, then pre-generate recipes for the current pantry"""
+    try:
+        await drop_stale_speculative_recipes()
+        # Any further pantry edit cancels this task, so the sleep acts as a debounce
+        await asyncio.sleep(SPECULATIVE_IDLE_SECONDS)
+        
+        pantry = await db.pantry.find({}, {"_id": 0, "ingredient_name": 1}).to_list(1000)
+        pantry_items = [item["ingredient_name"] for item in pantry]
+        if not pantry_items:
+            return
+        
+        health_profile = await load_health_profile()
+        versions = current_speculation_versions()
+        preferences = await get_common_meal_preferences()
+        # return_exceptions keeps this task waiting on every child, so cancelling
+        # it on the next pantry change also cancels children still running
+        results = await asyncio.gather(*[
+            speculate_recipe(generation, versions, pantry_items, dietary_preference, meal_type, health_profile)
+            for meal_type, dietary_preference in preferences
+        ], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Speculative generation failed: {str(result)}")
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logging.error(f"Speculative generation failed: {str(e)}")
+
+
+async def speculate_recipe(generation: int, versions: dict, pantry_items: List[str], dietary_preference: str, meal_type: str, health_profile: Optional[HealthProfile]) -> None:
+    """Generate one recipe in the background and stage it if still current"""
+    key = speculation_key(pantry_items, dietary_preference, meal_type, SPECULATIVE_SERVINGS,
+                          health_profile.id if health_profile else None)
+    async with speculative_semaphore:
+        if generation != speculative_generation:
+            return
+        if await db.speculative_recipes.count_documents({"key": key, **versions}, limit=1):
+            return
+        if not await reserve_speculative_call():
+            logging.info("Speculative generation budget exhausted, skipping")
+            return
+        
+        recipe_data = await generate_recipe_with_ai(
+            pantry_items=pantry_items,
+            dietary_preference=dietary_preference,
+            meal_type=meal_type,
+            servings=SPECULATIVE_SERVINGS,
+            health_profile=health_profile
+        )
+        image_url = await fetch_unsplash_image(f"{recipe_data['title']} food dish")
+    
+    if generation == speculative_generation and versions == current_speculation_versions():
+        await db.speculative_recipes.insert_one({
+            "key": key,
+            **versions,
+            "recipe_data": recipe_data,
+            "image_url": image_url,
+            "created_date": datetime.now(timezone.utc),
+        })
+        logging.info(f"Staged speculative {dietary_preference} recipe for {meal_type}")
+
+
+# ============= HTTP Caching =============
+
+# ETags are built from the shared region versions of the invalidation bus, so
+# they change exactly when the data does, agree across workers, and conditional
+# GETs can be answered without querying MongoDB.
+
+# (path pattern, cache region, Cache-Control header) for GET endpoints served with ETags
+CACHEABLE_ROUTES = [
+    (re.compile(r"^/api/ingredients(/categories)?/?$"), "ingredients", "public, no-cache"),
+    (re.compile(r"^/api/recipes/?$"), "recipes", "private, no-cache"),
+    (re.compile(r"^/api/recipes/[^/]+/?$"), "recipes", "private, no-cache"),
+]
+
+
+def build_etag(region: str, path: str, query: str) -> Optional[str]:
+    """Build a weak ETag from the region version and the request URL"""
+    version = cache_versions.get(region)
+    if version is None:
+        return None  # Versions not loaded yet
+    url_hash = hashlib.sha1(f"{path}?{query}".encode()).hexdigest()[:12]
+    # Weak because GZipMiddleware may change the encoded bytes of the body
+    return f'W/"{region}-{version}-{url_hash}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison"""
+    if not if_none_match:
+        return False
+    # "*" only matches when the resource exists, which is unknown before the
+    # handler runs, so it is left to fall through to a normal response
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in candidates]
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes the given paths through uncompressed"""
+    
+    def __init__(self, app, excluded_paths: Optional[List[str]] = None, **kwargs):
+        super().__init__(app, **kwargs)
+        self.excluded_paths = set(excluded_paths or [])
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+@app.middleware("http")
+async def http_cache_middleware(request: Request, call_next):
+    """Attach ETags to cacheable GETs and answer matching If-None-Match with 304"""
+    if request.method != "GET":
+        return await call_next(request)
+    
+    rule = next((r for r in CACHEABLE_ROUTES if r[0].match(request.url.path)), None)
+    if not rule:
+        return await call_next(request)
+    
+    _, region, cache_control = rule
+    # Computed before the handler runs so a concurrent write can only make the ETag older
+    etag = build_etag(region, request.url.path, request.url.query)
+    if not etag:
+        return await call_next(request)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+
 # ============= Initialize Ingredient Database =============
 
 INGREDIENT_DATABASE = [
@@ -433,6 +811,7 @@ async def initialize_ingredients():
             {**ing, "id": str(uuid.uuid4())} for ing in INGREDIENT_DATABASE
         ]
         await db.ingredients.insert_many(ingredients_with_ids)
+        await invalidate_cache("ingredients")
         logging.info(f"Initialized {len(INGREDIENT_DATABASE)} ingredients")
 
 
@@ -458,10 +837,27 @@ async def get_all_ingredients(category: Optional[str] = None, search: Optional[s
     return ingredients
 
 
+# Kept per worker and cleared through the invalidation bus when ingredients change
+ingredient_categories_cache = {}
+
+
+@on_cache_invalidation("ingredients")
+def clear_ingredient_categories_cache() -> None:
+    ingredient_categories_cache.clear()
+
+
 @api_router.get("/ingredients/categories")
 async def get_ingredient_categories():
     """Get all unique ingredient categories"""
+    if "categories" in ingredient_categories_cache:
+        return {"categories": ingredient_categories_cache["categories"]}
+    
+    version = cache_versions.get("ingredients")
     categories = await db.ingredients.distinct("category")
+    # Only cache if no ingredient write was seen while distinct was running,
+    # otherwise the result may predate the invalidation that cleared the cache
+    if version is not None and cache_versions.get("ingredients") == version:
+        ingredient_categories_cache["categories"] = categories
     return {"categories": categories}
 
 
@@ -478,6 +874,7 @@ async def add_custom_ingredient(ingredient: Ingredient):
     doc = ingredient.model_dump()
     
     await db.ingredients.insert_one(doc)
+    await invalidate_cache("ingredients")
     logging.info(f"New ingredient added: {ingredient.name} in category {ingredient.category}")
     
     return ingredient
@@ -504,6 +901,8 @@ async def add_to_pantry(item: PantryItem):
     doc['added_date'] = doc['added_date'].isoformat()
     
     await db.pantry.insert_one(doc)
+    await invalidate_cache("pantry")
+    schedule_speculative_generation()
     return item
 
 
@@ -513,6 +912,8 @@ async def remove_from_pantry(item_id: str):
     result = await db.pantry.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
+    await invalidate_cache("pantry")
+    schedule_speculative_generation()
     return {"message": "Item removed from pantry"}
 
 
@@ -520,6 +921,8 @@ async def remove_from_pantry(item_id: str):
 async def clear_pantry():
     """Clear all items from pantry"""
     await db.pantry.delete_many({})
+    await invalidate_cache("pantry")
+    schedule_speculative_generation()
     return {"message": "Pantry cleared"}
 
 
@@ -554,6 +957,8 @@ async def create_or_update_health_profile(profile: HealthProfile):
     doc['updated_date'] = doc['updated_date'].isoformat()
     
     await db.health_profiles.insert_one(doc)
+    await invalidate_cache("health_profile")
+    schedule_speculative_generation()
     return profile
 
 
@@ -568,38 +973,29 @@ async def generate_recipe(request: RecipeRequest):
     
     meal_type = request.meal_type or "any meal"
     
-    # Get health profile if specified
-    health_profile = None
-    if request.health_profile_id:
-        profile_doc = await db.health_profiles.find_one({"id": request.health_profile_id}, {"_id": 0})
-        if profile_doc:
-            if isinstance(profile_doc.get('created_date'), str):
-                profile_doc['created_date'] = datetime.fromisoformat(profile_doc['created_date'])
-            if isinstance(profile_doc.get('updated_date'), str):
-                profile_doc['updated_date'] = datetime.fromisoformat(profile_doc['updated_date'])
-            health_profile = HealthProfile(**profile_doc)
-    else:
-        # Get default health profile
-        profile_doc = await db.health_profiles.find_one({}, {"_id": 0})
-        if profile_doc:
-            if isinstance(profile_doc.get('created_date'), str):
-                profile_doc['created_date'] = datetime.fromisoformat(profile_doc['created_date'])
-            if isinstance(profile_doc.get('updated_date'), str):
-                profile_doc['updated_date'] = datetime.fromisoformat(profile_doc['updated_date'])
-            health_profile = HealthProfile(**profile_doc)
-    
-    # Generate recipe using AI
-    recipe_data = await generate_recipe_with_ai(
-        pantry_items=request.pantry_items,
-        dietary_preference=request.dietary_preference,
-        meal_type=meal_type,
-        servings=request.servings,
-        health_profile=health_profile
-    )
+    # Get health profile if specified, otherwise the default profile
+    health_profile = await load_health_profile(request.health_profile_id)
     
-    # Fetch recipe image based on title and main ingredients
-    recipe_image_query = f"{recipe_data['title']} food dish"
-    recipe_image_url = await fetch_unsplash_image(recipe_image_query)
+    # Serve a recipe pre-generated for this exact request if one is staged
+    key = speculation_key(request.pantry_items, request.dietary_preference, meal_type, request.servings,
+                          health_profile.id if health_profile else None)
+    staged = await claim_speculative_recipe(key) if SPECULATIVE_GENERATION_ENABLED else None
+    if staged:
+        recipe_data = staged["recipe_data"]
+        recipe_image_url = staged["image_url"]
+    else:
+        # Generate recipe using AI
+        recipe_data = await generate_recipe_with_ai(
+            pantry_items=request.pantry_items,
+            dietary_preference=request.dietary_preference,
+            meal_type=meal_type,
+            servings=request.servings,
+            health_profile=health_profile
+        )
+        
+        # Fetch recipe image based on title and main ingredients
+        recipe_image_query = f"{recipe_data['title']} food dish"
+        recipe_image_url = await fetch_unsplash_image(recipe_image_query)
     
     # Create Recipe object
     recipe = Recipe(
@@ -626,6 +1022,7 @@ async def generate_recipe(request: RecipeRequest):
     doc = recipe.model_dump()
     doc['created_date'] = doc['created_date'].isoformat()
     await db.recipes.insert_one(doc)
+    await invalidate_cache("recipes")
     
     return recipe
 
@@ -668,6 +1065,7 @@ async def toggle_favorite(recipe_id: str, is_favorite: bool):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    await invalidate_cache("recipes")
     return {"message": "Favorite status updated"}
 
 
@@ -677,6 +1075,7 @@ async def delete_recipe(recipe_id: str):
     result = await db.recipes.delete_one({"id": recipe_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    await invalidate_cache("recipes")
     return {"message": "Recipe deleted"}
 
 
@@ -705,6 +1104,226 @@ async def get_recipe_ratings(recipe_id: str):
     return ratings
 
 
+# --- Export / Import Endpoints ---
+
+# Collections included in backups, with the model used to validate imported
+# documents, the field used for date filtering and the cache region to invalidate
+BACKUP_COLLECTIONS = {
+    "recipes": {"model": Recipe, "date_field": "created_date", "cache_region": "recipes"},
+    "recipe_ratings": {"model": RecipeRating, "date_field": "created_date", "cache_region": None},
+    "pantry": {"model": PantryItem, "date_field": "added_date", "cache_region": "pantry"},
+}
+EXPORT_BATCH_SIZE = 500
+IMPORT_BULK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 20
+IMPORT_MAX_LINE_BYTES = 1024 * 1024
+IMPORT_DECOMPRESS_CHUNK_BYTES = 64 * 1024  # bounds output per decompress call against gzip bombs
+
+
+class UploadLineTooLongError(Exception):
+    """An uploaded NDJSON line exceeded IMPORT_MAX_LINE_BYTES"""
+
+
+def parse_backup_collections(collections: str) -> List[str]:
+    """Validate a comma-separated list of collection names"""
+    names = [name.strip() for name in collections.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BACKUP_COLLECTIONS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Collections must be a subset of: {', '.join(BACKUP_COLLECTIONS)}"
+        )
+    return names
+
+
+def to_utc_isoformat(value: datetime) -> str:
+    """Format a datetime the way dates are stored, so string comparisons work"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+async def stream_export_lines(names: List[str], since: Optional[datetime], until: Optional[datetime], favorites_only: bool):
+    """Yield NDJSON records from batched cursors, one chunk per batch"""
+    for name in names:
+        query = {}
+        date_field = BACKUP_COLLECTIONS[name]["date_field"]
+        if since or until:
+            query[date_field] = {}
+            if since:
+                query[date_field]["$gte"] = to_utc_isoformat(since)
+            if until:
+                query[date_field]["$lt"] = to_utc_isoformat(until)
+        if favorites_only and name == "recipes":
+            query["is_favorite"] = True
+        
+        lines = []
+        cursor = db[name].find(query, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+        async for doc in cursor:
+            lines.append(json.dumps({"collection": name, "document": doc}, default=str) + "\n")
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "".join(lines).encode()
+                lines = []
+        if lines:
+            yield "".join(lines).encode()
+
+
+async def gzip_stream(chunks):
+    """Compress an async byte stream incrementally into a gzip file"""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def iter_upload_lines(request: Request):
+    """Yield (line number, line) for non-empty lines of an NDJSON upload, gunzipping it if needed"""
+    decompressor = None
+    is_first_chunk = True
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        if is_first_chunk:
+            # Detect gzip uploads by their magic number
+            if chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(wbits=31)
+            is_first_chunk = False
+        
+        data = chunk
+        while data:
+            if decompressor:
+                if decompressor.eof:
+                    # Concatenated gzip members: start a new decompressor on the remainder
+                    decompressor = zlib.decompressobj(wbits=31)
+                buffer += decompressor.decompress(data, IMPORT_DECOMPRESS_CHUNK_BYTES)
+                data = decompressor.unconsumed_tail or decompressor.unused_data
+            else:
+                buffer += data
+                data = b""
+            
+            lines = buffer.split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                line_number += 1
+                if len(line) > IMPORT_MAX_LINE_BYTES:
+                    raise UploadLineTooLongError(f"Line {line_number} exceeds {IMPORT_MAX_LINE_BYTES} bytes")
+                if line.strip():
+                    yield line_number, line
+            if len(buffer) > IMPORT_MAX_LINE_BYTES:
+                raise UploadLineTooLongError(f"Line {line_number + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes")
+    
+    if decompressor:
+        buffer += decompressor.flush()
+        if not decompressor.eof:
+            raise zlib.error("Truncated gzip stream")
+    if len(buffer) > IMPORT_MAX_LINE_BYTES:
+        raise UploadLineTooLongError(f"Line {line_number + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+
+@api_router.get("/export")
+async def export_data(
+    collections: str = "recipes,recipe_ratings,pantry",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    favorites_only: bool = False,
+    compress: bool = False
+):
+    """Stream recipes, ratings and pantry items as NDJSON"""
+    names = parse_backup_collections(collections)
+    
+    body = stream_export_lines(names, since, until, favorites_only)
+    filename = f"recipes-export-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}.ndjson"
+    media_type = "application/x-ndjson"
+    if compress:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.on_event("startup")
+async def ensure_backup_indexes():
+    """Index the id field that imports upsert by"""
+    for name in BACKUP_COLLECTIONS:
+        await db[name].create_index("id")
+
+
+@api_router.post("/import")
+async def import_data(request: Request):
+    """Upsert records from an NDJSON export (optionally gzipped) by their id"""
+    imported = {name: 0 for name in BACKUP_COLLECTIONS}
+    pending = {name: [] for name in BACKUP_COLLECTIONS}
+    errors = []
+    skipped = 0
+    
+    async def flush(name: str):
+        if pending[name]:
+            try:
+                await db[name].bulk_write(pending[name], ordered=False)
+                imported[name] += len(pending[name])
+            except BulkWriteError as e:
+                # Unordered, so the rest of the batch was still written
+                imported[name] += e.details.get("nUpserted", 0) + e.details.get("nMatched", 0)
+                raise
+            finally:
+                pending[name] = []
+    
+    failure = None
+    try:
+        async for line_number, line in iter_upload_lines(request):
+            try:
+                record = json.loads(line)
+                name = record["collection"]
+                config = BACKUP_COLLECTIONS[name]
+                item = config["model"](**record["document"])
+            except (ValueError, KeyError, TypeError, ValidationError) as e:
+                skipped += 1
+                if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                    errors.append(f"Line {line_number}: {str(e)}")
+                continue
+            
+            doc = item.model_dump()
+            doc[config["date_field"]] = to_utc_isoformat(doc[config["date_field"]])
+            pending[name].append(ReplaceOne({"id": doc["id"]}, doc, upsert=True))
+            if len(pending[name]) >= IMPORT_BULK_SIZE:
+                await flush(name)
+        
+        for name in BACKUP_COLLECTIONS:
+            await flush(name)
+    except zlib.error as e:
+        failure = f"Invalid gzip upload: {str(e)}"
+    except BulkWriteError as e:
+        failure = f"Bulk write failed: {str(e)}"
+    except UploadLineTooLongError as e:
+        failure = str(e)
+    
+    # Earlier batches are already written, so invalidate even after a failure
+    for name, config in BACKUP_COLLECTIONS.items():
+        if imported[name] and config["cache_region"]:
+            await invalidate_cache(config["cache_region"])
+    
+    if failure:
+        logging.error(f"Import aborted after {imported}: {failure}")
+        raise HTTPException(
+            status_code=400,
+            detail={"message": failure, "imported": imported, "skipped": skipped, "errors": errors}
+        )
+    
+    logging.info(f"Import finished: {imported}, {skipped} lines skipped")
+    return {"imported": imported, "skipped": skipped, "errors": errors}
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -716,6 +1335,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON bodies such as full recipe documents. The export endpoint
+# compresses its own stream on request, so it is left out to avoid gzipping twice
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1024, excluded_paths=["/api/export"])
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -725,4 +1348,7 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if cache_invalidation_task:
+        cache_invalidation_task.cancel()
+    discard_speculative_results()
     client.close()